@@ -1,15 +1,92 @@
 import argparse
 import json
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.json as paj
+except ImportError:
+    pa = None
+
+
+def _loads(line: bytes):
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # Older logs may contain Infinity/NaN, which only stdlib json accepts.
+            pass
+    return json.loads(line)
 
 
 def read_jsonl(path: str):
-    with open(path, "r", encoding="utf-8") as f:
+    with open(path, "rb") as f:
         for line in f:
-            line = line.strip()
-            if not line:
+            if line.isspace():
                 continue
-            yield json.loads(line)
+            yield _loads(line)
+
+
+def tail_jsonl(path: str, n: int):
+    with open(path, "rb") as f:
+        lines = deque((line for line in f if not line.isspace()), maxlen=n)
+    return [_loads(line) for line in lines]
+
+
+def summarize_stream(path: str):
+    total = 0
+    event_counter = Counter()
+    reason_counter = Counter()
+    by_event_reason = defaultdict(int)
+    tail = deque(maxlen=10)
+
+    for e in read_jsonl(path):
+        total += 1
+        event = e.get("event", "unknown")
+        event_counter[event] += 1
+        if "reason" in e:
+            reason_counter[e["reason"]] += 1
+        by_event_reason[(event, e.get("reason", "n/a"))] += 1
+        tail.append(e)
+
+    return total, event_counter, reason_counter, by_event_reason, list(tail)
+
+
+def _value_counts(column) -> Counter:
+    return Counter({row["values"]: row["counts"] for row in pc.value_counts(column).to_pylist()})
+
+
+def summarize_arrow(path: str):
+    """Count events with pyarrow's columnar JSON reader instead of a Python loop."""
+    table = paj.read_json(path)
+    total = table.num_rows
+    if not total:
+        return 0, Counter(), Counter(), {}, []
+
+    null_strings = pa.nulls(total, pa.string())
+    event = table.column("event") if "event" in table.column_names else null_strings
+    reason = table.column("reason") if "reason" in table.column_names else null_strings
+    event = pc.fill_null(event, "unknown")
+
+    event_counter = _value_counts(event)
+    reason_counter = _value_counts(pc.drop_null(reason))
+
+    grouped = (
+        pa.table({"event": event, "reason": pc.fill_null(reason, "n/a")})
+        .group_by(["event", "reason"])
+        .aggregate([("event", "count")])
+    )
+    by_event_reason = {
+        (row["event"], row["reason"]): row["event_count"] for row in grouped.to_pylist()
+    }
+
+    return total, event_counter, reason_counter, by_event_reason, tail_jsonl(path, 10)
 
 
 def main():
@@ -17,29 +94,35 @@ def main():
     ap.add_argument("--rotation-log", required=True)
     args = ap.parse_args()
 
-    events = list(read_jsonl(args.rotation_log))
-    if not events:
+    summary = None
+    if pa is not None:
+        try:
+            summary = summarize_arrow(args.rotation_log)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, KeyError):
+            # Mixed column types, Infinity/NaN, empty file, ...: take the slow path.
+            summary = None
+    if summary is None:
+        summary = summarize_stream(args.rotation_log)
+
+    total, event_counter, reason_counter, by_event_reason, tail = summary
+    if not total:
         print("No events found.")
         return
 
-    event_counter = Counter(e.get("event", "unknown") for e in events)
-    reason_counter = Counter(e.get("reason", "n/a") for e in events if "reason" in e)
-
-    by_event_reason = defaultdict(int)
-    for e in events:
-        by_event_reason[(e.get("event", "unknown"), e.get("reason", "n/a"))] += 1
-
-    print(f"Total events: {len(events)}")
-    print("Event counts:", dict(event_counter))
-    print("Reason counts:", dict(reason_counter))
+    print(f"Total events: {total}")
+    print("Event counts:", dict(event_counter.most_common()))
+    print("Reason counts:", dict(reason_counter.most_common()))
     print("\nEvent + reason breakdown:")
     for k, v in sorted(by_event_reason.items()):
         print(f"  {k}: {v}")
 
     print("\nLast 10 events:")
-    for e in events[-10:]:
-        print(json.dumps(e, indent=2, ensure_ascii=False))
+    for e in tail:
+        if orjson is not None:
+            print(orjson.dumps(e, option=orjson.OPT_INDENT_2).decode("utf-8"))
+        else:
+            print(json.dumps(e, indent=2, ensure_ascii=False))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
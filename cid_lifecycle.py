@@ -1,9 +1,18 @@
+import atexit
 import json
 import os
 import random
+import threading
 import time
+import weakref
+from queue import SimpleQueue
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 @dataclass
@@ -17,17 +26,134 @@ class RotationPolicy:
     random_seed: Optional[int] = None
 
 
+# Directories already created/checked by JsonlLogger, so per-connection loggers skip the syscalls.
+_ensured_dirs: Set[str] = set()
+
+
+class AsyncFileWriter(threading.Thread):
+    """
+    Appends bytes to a file from a background thread.
+
+    write() only enqueues, so the event loop never blocks on disk I/O. The
+    thread drains everything queued so far and appends it with one
+    os.write(), and each write() call's bytes land contiguously. Use
+    for_path() to share one writer (and one fd) per file; writers are closed,
+    drained and joined by close() or at interpreter exit.
+    """
+
+    _by_path: Dict[str, "AsyncFileWriter"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path: str, mode: int = 0o644):
+        super().__init__(name=f"AsyncFileWriter({path})", daemon=True)
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, mode)
+        self._queue: "SimpleQueue[Optional[bytes]]" = SimpleQueue()
+        self._closed = False
+        self.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def for_path(cls, path: str, mode: int = 0o644) -> "AsyncFileWriter":
+        key = os.path.abspath(path)
+        with cls._lock:
+            writer = cls._by_path.get(key)
+            if writer is None or writer._closed:
+                writer = cls._by_path[key] = cls(path, mode)
+            return writer
+
+    def write(self, data: bytes) -> None:
+        if not self._closed:
+            self._queue.put(data)
+
+    def run(self) -> None:
+        queue = self._queue
+        done = False
+        while not done:
+            chunks = [queue.get()]
+            while not queue.empty():
+                chunks.append(queue.get())
+            if chunks[-1] is None:
+                chunks.pop()
+                done = True
+            view = memoryview(b"".join(chunks))
+            while view:
+                view = view[os.write(self._fd, view):]
+        os.close(self._fd)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self.join()
+        atexit.unregister(self.close)
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Drain and join every shared writer (for exits that bypass atexit, e.g. os._exit())."""
+        with cls._lock:
+            writers = list(cls._by_path.values())
+            cls._by_path.clear()
+        for writer in writers:
+            writer.close()
+
+
 class JsonlLogger:
+    """
+    Append-only JSONL writer.
+
+    Lines are buffered in memory and handed to the path's shared
+    AsyncFileWriter in one batch when either FLUSH_MAX_LINES or
+    FLUSH_MAX_AGE_S is reached. Each batch is written as whole lines, so
+    several loggers sharing one path never interleave partial records.
+    Pending lines are handed over on flush()/close() and at interpreter exit.
+    """
+
+    FLUSH_MAX_LINES = 64
+    FLUSH_MAX_AGE_S = 0.05
+
     def __init__(self, path: str):
         self.path = path
         d = os.path.dirname(path)
-        if d:
-            os.makedirs(d, exist_ok=True)
+        if d and d not in _ensured_dirs:
+            if not os.path.isdir(d):
+                os.makedirs(d, exist_ok=True)
+            _ensured_dirs.add(d)
+
+        self._writer = AsyncFileWriter.for_path(path)
+        self._closed = False
+        self._buf: List[bytes] = []
+        self._last_flush = time.time()
+        atexit.register(self.close)
 
     def log(self, event: Dict[str, Any]) -> None:
-        event["ts"] = time.time()
-        with open(self.path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        now = time.time()
+        event["ts"] = now
+        self._buf.append(self._dumps(event))
+        if len(self._buf) >= self.FLUSH_MAX_LINES or now - self._last_flush >= self.FLUSH_MAX_AGE_S:
+            self.flush()
+
+    @staticmethod
+    def _dumps(event: Dict[str, Any]) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
+        return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def flush(self) -> None:
+        self._last_flush = time.time()
+        if not self._buf or self._closed:
+            return
+        self._writer.write(b"".join(self._buf))
+        self._buf.clear()
+
+    def close(self) -> None:
+        # The writer is shared by every logger on this path; it closes itself at exit.
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        atexit.unregister(self.close)
 
 
 @dataclass
@@ -35,7 +161,7 @@ class RetiringCid:
     cid_obj: Any
     cid_hex: Optional[str]
     sequence_number: Optional[int]
-    retire_at: float
+    retire_at_ns: int
     reason: str
     path_id: Optional[str] = None
 
@@ -52,8 +178,43 @@ class CidLifecycleManager:
       - grace-period retirement
       - structured JSONL logs
       - optional console callback for demo-friendly terminal output
+
+    Deadlines are kept as integer nanoseconds on the time.monotonic_ns()
+    clock, the same clock asyncio's loop.time() reads, so callers can
+    schedule tick() with loop.call_at(). Times written to the log are
+    converted back to seconds.
     """
 
+    __slots__ = (
+        "policy",
+        "log",
+        "role",
+        "console_callback",
+        "_rng",
+        "_timer_disabled",
+        "_jitter_fraction",
+        "_min_gap_ns",
+        "_grace_period_ns",
+        "_initialized",
+        "_allocation_started_at_ns",
+        "_allocation_deadline_ns",
+        "_allocation_bytes_base",
+        "_last_rotate_ns",
+        "_current_path_id",
+        "_current_cid_hex",
+        "_cached_cid_bytes",
+        "_cached_cid_hex",
+        "_path_id_addr",
+        "_path_id_str",
+        "_retiring",
+        "_strategies",
+    )
+
+    # Path changes and the volume trigger can only be observed by polling.
+    POLL_INTERVAL_S = 0.2
+    _POLL_INTERVAL_NS = int(POLL_INTERVAL_S * 1e9)
+    _NEVER_NS = 2**63 - 1
+
     def __init__(
         self,
         policy: RotationPolicy,
@@ -67,17 +228,37 @@ class CidLifecycleManager:
         self.console_callback = console_callback
 
         self._rng = random.Random(policy.random_seed)
+        self._timer_disabled = policy.cid_time_interval_s <= 0
+        self._jitter_fraction = max(0.0, policy.cid_jitter_fraction)
+        self._min_gap_ns = int(policy.min_gap_s * 1e9)
+        self._grace_period_ns = int(policy.cid_grace_period_s * 1e9)
 
         self._initialized = False
-        self._allocation_started_at = 0.0
-        self._allocation_deadline = float("inf")
+        self._allocation_started_at_ns = 0
+        self._allocation_deadline_ns = self._NEVER_NS
         self._allocation_bytes_base = 0
-        self._last_rotate = 0.0
+        self._last_rotate_ns: Optional[int] = None
 
         self._current_path_id: Optional[str] = None
         self._current_cid_hex: Optional[str] = None
+        # Keyed on the cid bytes rather than the _peer_cid wrapper: aioquic
+        # rewrites _peer_cid.cid in place on the first server packet and on Retry.
+        self._cached_cid_bytes: Any = None
+        self._cached_cid_hex: Optional[str] = None
+        self._path_id_addr: Any = None
+        self._path_id_str: Optional[str] = None
 
         self._retiring: List[RetiringCid] = []
+        self._strategies: Dict[int, str] = {}
+
+    def close(self) -> None:
+        self.log.close()
+
+    def __del__(self) -> None:
+        try:
+            self.log.flush()
+        except Exception:
+            pass
 
     def _emit(self, event: Dict[str, Any]) -> None:
         self.log.log(event)
@@ -89,16 +270,18 @@ class CidLifecycleManager:
 
     def tick(self, protocol: Any) -> None:
         quic = protocol._quic
-        now = time.time()
+        now_ns = time.monotonic_ns()
 
-        self._initialize_if_needed(quic, now)
-        self._poll_retirements(protocol, now)
+        self._initialize_if_needed(quic, now_ns)
+        self._poll_retirements(protocol, now_ns)
 
         if self.policy.cid_policy == "baseline":
             return
 
-        observed_path_id = self._get_current_path_id(quic)
-        observed_path_validated = self._is_current_path_validated(quic)
+        count_bytes = self.policy.cid_byte_threshold > 0
+        observed_path_id, observed_path_validated, total_bytes_sent = self._observe_paths(
+            quic, count_bytes=count_bytes
+        )
 
         if (
             observed_path_id is not None
@@ -118,8 +301,8 @@ class CidLifecycleManager:
         if observed_path_id is not None:
             self._current_path_id = observed_path_id
 
-        if self.policy.cid_byte_threshold > 0:
-            sent_since_allocation = self._bytes_sent_since_allocation(quic)
+        if count_bytes:
+            sent_since_allocation = total_bytes_sent - self._allocation_bytes_base
             if sent_since_allocation >= self.policy.cid_byte_threshold:
                 self._rotate_now(
                     protocol,
@@ -131,16 +314,35 @@ class CidLifecycleManager:
                 )
                 return
 
-        if now >= self._allocation_deadline:
+        if now_ns >= self._allocation_deadline_ns:
             self._rotate_now(
                 protocol,
                 reason="timer",
                 extra={
-                    "deadline": self._allocation_deadline,
-                    "elapsed": now - self._allocation_started_at,
+                    "deadline": self._wall_s(self._allocation_deadline_ns),
+                    "elapsed": (now_ns - self._allocation_started_at_ns) / 1e9,
                 },
             )
 
+    def next_tick_at(self) -> float:
+        """Return the monotonic time, in loop.time() seconds, at which tick() next has work to do."""
+        now_ns = time.monotonic_ns()
+        if not self._initialized:
+            return now_ns / 1e9
+
+        due_ns = self._NEVER_NS
+        if self.policy.cid_policy != "baseline":
+            due_ns = now_ns + self._POLL_INTERVAL_NS
+
+        t = self._allocation_deadline_ns
+        if now_ns < t < due_ns:
+            due_ns = t
+        for item in self._retiring:
+            t = item.retire_at_ns
+            if now_ns < t < due_ns:
+                due_ns = t
+        return float("inf") if due_ns == self._NEVER_NS else due_ns / 1e9
+
     def on_path_validated(
         self,
         protocol: Any,
@@ -160,15 +362,15 @@ class CidLifecycleManager:
         )
 
     def force_rotate(self, protocol: Any, reason: str = "manual") -> None:
-        self._initialize_if_needed(protocol._quic, time.time())
+        self._initialize_if_needed(protocol._quic, time.monotonic_ns())
         self._rotate_now(protocol, reason=reason, extra={})
 
-    def _initialize_if_needed(self, quic: Any, now: float) -> None:
+    def _initialize_if_needed(self, quic: Any, now_ns: int) -> None:
         if self._initialized:
             return
 
-        self._allocation_started_at = now
-        self._allocation_deadline = self._compute_deadline(now)
+        self._allocation_started_at_ns = now_ns
+        self._allocation_deadline_ns = self._compute_deadline(now_ns)
         self._allocation_bytes_base = self._get_total_bytes_sent(quic)
         self._current_path_id = self._get_current_path_id(quic)
         self._current_cid_hex = self._get_active_cid_hex(quic)
@@ -187,29 +389,39 @@ class CidLifecycleManager:
                     "min_gap_s": self.policy.min_gap_s,
                     "current_path_id": self._current_path_id,
                     "current_cid_hex": self._current_cid_hex,
-                    "allocation_deadline": self._allocation_deadline,
+                    "allocation_deadline": self._deadline_s(),
                 },
             }
         )
 
-    def _compute_deadline(self, now: float) -> float:
-        if self.policy.cid_time_interval_s <= 0:
-            return float("inf")
+    def _compute_deadline(self, now_ns: int) -> int:
+        if self._timer_disabled:
+            return self._NEVER_NS
+
+        delta = self._rng.uniform(-self._jitter_fraction, self._jitter_fraction)
+        effective_lifetime_ns = int(self.policy.cid_time_interval_s * (1.0 + delta) * 1e9)
+        if self._jitter_fraction >= 1.0:
+            effective_lifetime_ns = max(1_000_000, effective_lifetime_ns)
+        return now_ns + effective_lifetime_ns
+
+    def _deadline_s(self) -> Optional[float]:
+        if self._allocation_deadline_ns == self._NEVER_NS:
+            return None
+        return self._wall_s(self._allocation_deadline_ns)
 
-        jitter_fraction = max(0.0, self.policy.cid_jitter_fraction)
-        delta = self._rng.uniform(-jitter_fraction, jitter_fraction)
-        effective_lifetime = self.policy.cid_time_interval_s * (1.0 + delta)
-        effective_lifetime = max(0.001, effective_lifetime)
-        return now + effective_lifetime
+    @staticmethod
+    def _wall_s(deadline_ns: int) -> float:
+        # Deadlines live on the monotonic clock; logs carry epoch seconds like "ts".
+        return time.time() + (deadline_ns - time.monotonic_ns()) / 1e9
 
     def _rotate_now(self, protocol: Any, reason: str, extra: Dict[str, Any]) -> None:
         quic = protocol._quic
-        now = time.time()
+        now_ns = time.monotonic_ns()
 
         if self.policy.cid_policy == "baseline":
             return
 
-        if (now - self._last_rotate) < self.policy.min_gap_s:
+        if self._last_rotate_ns is not None and (now_ns - self._last_rotate_ns) < self._min_gap_ns:
             self._emit(
                 {
                     "event": "rotate_skipped",
@@ -218,7 +430,7 @@ class CidLifecycleManager:
                     "detail": {
                         "note": "min_gap_guard",
                         "min_gap_s": self.policy.min_gap_s,
-                        "since_last_rotate_s": now - self._last_rotate,
+                        "since_last_rotate_s": (now_ns - self._last_rotate_ns) / 1e9,
                         **extra,
                     },
                 }
@@ -232,13 +444,13 @@ class CidLifecycleManager:
         ok, detail = self._try_rotate_with_grace(quic, reason=reason, path_id=old_path_id)
         if ok:
             try:
-                protocol.transmit()
+                self._transmit(protocol)
             except Exception:
                 pass
 
-            self._last_rotate = now
-            self._allocation_started_at = now
-            self._allocation_deadline = self._compute_deadline(now)
+            self._last_rotate_ns = now_ns
+            self._allocation_started_at_ns = now_ns
+            self._allocation_deadline_ns = self._compute_deadline(now_ns)
             self._allocation_bytes_base = self._get_total_bytes_sent(quic)
             self._current_path_id = self._get_current_path_id(quic)
             self._current_cid_hex = self._get_active_cid_hex(quic)
@@ -285,13 +497,11 @@ class CidLifecycleManager:
             "grace_period_s": self.policy.cid_grace_period_s,
         }
 
-        if (
-            self.policy.cid_grace_period_s > 0
-            and hasattr(quic, "_peer_cid")
-            and hasattr(quic, "_peer_cid_available")
-            and hasattr(quic, "_consume_peer_cid")
-            and hasattr(quic, "_retire_peer_cid")
-        ):
+        strategy = self._strategies.get(id(quic))
+        if strategy is None:
+            strategy = self._resolve_strategy(quic)
+
+        if strategy == "deferred_internal":
             try:
                 if not getattr(quic, "_peer_cid_available"):
                     return False, {
@@ -308,13 +518,13 @@ class CidLifecycleManager:
                 new_hex = self._safe_hex(getattr(new_peer_cid, "cid", None))
                 new_seq = getattr(new_peer_cid, "sequence_number", None)
 
-                retire_at = time.time() + self.policy.cid_grace_period_s
+                retire_at_ns = time.monotonic_ns() + self._grace_period_ns
                 self._retiring.append(
                     RetiringCid(
                         cid_obj=old_peer_cid,
                         cid_hex=old_hex,
                         sequence_number=old_seq,
-                        retire_at=retire_at,
+                        retire_at_ns=retire_at_ns,
                         reason=reason,
                         path_id=path_id,
                     )
@@ -327,7 +537,7 @@ class CidLifecycleManager:
                         "new_sequence_number": new_seq,
                         "old_cid_hex": old_hex,
                         "new_cid_hex": new_hex,
-                        "retire_at": retire_at,
+                        "retire_at": self._wall_s(retire_at_ns),
                     }
                 )
                 return True, detail
@@ -337,7 +547,7 @@ class CidLifecycleManager:
                     "note": f"{type(e).__name__}: {e}",
                 }
 
-        if hasattr(quic, "change_connection_id") and callable(getattr(quic, "change_connection_id")):
+        if strategy == "public_change_connection_id":
             try:
                 detail["strategy"] = "public_change_connection_id"
                 quic.change_connection_id()
@@ -354,14 +564,54 @@ class CidLifecycleManager:
             "note": "No supported CID rotation API found.",
         }
 
-    def _poll_retirements(self, protocol: Any, now: float) -> None:
+    def _resolve_strategy(self, quic: Any) -> str:
+        """
+        Probe which rotation API this QuicConnection offers.
+
+        The answer cannot change for the lifetime of a connection, so it is
+        cached per connection and dropped again when the connection is freed.
+        """
+        if (
+            self.policy.cid_grace_period_s > 0
+            and hasattr(quic, "_peer_cid")
+            and hasattr(quic, "_peer_cid_available")
+            and hasattr(quic, "_consume_peer_cid")
+            and hasattr(quic, "_retire_peer_cid")
+        ):
+            strategy = "deferred_internal"
+        elif hasattr(quic, "change_connection_id") and callable(getattr(quic, "change_connection_id")):
+            strategy = "public_change_connection_id"
+        else:
+            strategy = "none"
+
+        key = id(quic)
+        try:
+            weakref.finalize(quic, self._strategies.pop, key, None)
+        except TypeError:
+            # Not weak-referenceable: don't cache, since the id could be reused.
+            return strategy
+        self._strategies[key] = strategy
+        return strategy
+
+    @staticmethod
+    def _transmit(protocol: Any) -> None:
+        # aioquic's _transmit_soon() defers to call_soon and collapses repeated
+        # requests, so a rotation plus any retirements due in the same tick
+        # leave in one packetisation pass instead of one per call.
+        transmit_soon = getattr(protocol, "_transmit_soon", None)
+        if transmit_soon is not None:
+            transmit_soon()
+        else:
+            protocol.transmit()
+
+    def _poll_retirements(self, protocol: Any, now_ns: int) -> None:
         quic = protocol._quic
         if not self._retiring:
             return
 
         remaining: List[RetiringCid] = []
         for item in self._retiring:
-            if now < item.retire_at:
+            if now_ns < item.retire_at_ns:
                 remaining.append(item)
                 continue
 
@@ -370,7 +620,7 @@ class CidLifecycleManager:
             try:
                 if hasattr(quic, "_retire_peer_cid"):
                     quic._retire_peer_cid(item.cid_obj)
-                    protocol.transmit()
+                    self._transmit(protocol)
                     ok = True
                 else:
                     note = "Internal _retire_peer_cid unavailable."
@@ -387,7 +637,7 @@ class CidLifecycleManager:
                         "sequence_number": item.sequence_number,
                         "path_id": item.path_id,
                         "grace_period_s": self.policy.cid_grace_period_s,
-                        "retire_at": item.retire_at,
+                        "retire_at": self._wall_s(item.retire_at_ns),
                         "note": note,
                     },
                 }
@@ -395,13 +645,41 @@ class CidLifecycleManager:
 
         self._retiring = remaining
 
-    def _get_total_bytes_sent(self, quic: Any) -> int:
-        paths = getattr(quic, "_network_paths", []) or []
+    def _observe_paths(self, quic: Any, count_bytes: bool) -> Tuple[Optional[str], bool, int]:
+        """
+        Fused form of _get_current_path_id, the current path's validation
+        state and (when count_bytes is set) _get_total_bytes_sent for the
+        tick() path, touching quic._network_paths once.
+        """
+        paths = getattr(quic, "_network_paths", None)
+        if not paths:
+            return None, False, 0
+
+        total = self._sum_bytes_sent(paths) if count_bytes else 0
+
+        p = paths[0]
+        return self._path_id(getattr(p, "addr", None)), bool(getattr(p, "is_validated", False)), total
+
+    def _path_id(self, addr: Any) -> Optional[str]:
+        # A path's addr tuple is fixed, so reuse its string form instead of
+        # re-formatting it on every tick.
+        if addr is None:
+            return None
+        if addr is not self._path_id_addr:
+            self._path_id_addr = addr
+            self._path_id_str = str(addr)
+        return self._path_id_str
+
+    @staticmethod
+    def _sum_bytes_sent(paths: Any) -> int:
         total = 0
         for p in paths:
             total += int(getattr(p, "bytes_sent", 0) or 0)
         return total
 
+    def _get_total_bytes_sent(self, quic: Any) -> int:
+        return self._sum_bytes_sent(getattr(quic, "_network_paths", []) or [])
+
     def _bytes_sent_since_allocation(self, quic: Any) -> int:
         return self._get_total_bytes_sent(quic) - self._allocation_bytes_base
 
@@ -410,24 +688,18 @@ class CidLifecycleManager:
         if not paths:
             return None
 
-        p = paths[0]
-        addr = getattr(p, "addr", None)
-        if addr is None:
-            return None
-
-        return str(addr)
-
-    def _is_current_path_validated(self, quic: Any) -> bool:
-        paths = getattr(quic, "_network_paths", None)
-        if not paths:
-            return False
-        p = paths[0]
-        return bool(getattr(p, "is_validated", False))
+        return self._path_id(getattr(paths[0], "addr", None))
 
     def _get_active_cid_hex(self, quic: Any) -> Optional[str]:
         peer_cid = getattr(quic, "_peer_cid", None)
         if peer_cid is not None and hasattr(peer_cid, "cid"):
-            return self._safe_hex(peer_cid.cid)
+            cid = peer_cid.cid
+            if cid is self._cached_cid_bytes:
+                return self._cached_cid_hex
+            cid_hex = self._safe_hex(cid)
+            self._cached_cid_bytes = cid
+            self._cached_cid_hex = cid_hex
+            return cid_hex
 
         host_cid = getattr(quic, "host_cid", None)
         if host_cid is not None:
@@ -1,135 +1,22 @@
 import argparse
 import asyncio
-import json
 import os
 import ssl
 import time
-from datetime import datetime
 from typing import Optional
 
 from aioquic.asyncio import QuicConnectionProtocol, connect
 from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.events import (
+    ConnectionTerminated,
+    HandshakeCompleted,
+    ProtocolNegotiated,
+    StreamDataReceived,
+)
 from aioquic.quic.logger import QuicLogger
 
 from cid_lifecycle import CidLifecycleManager, RotationPolicy
-
-
-RESET = "\033[0m"
-GREEN = "\033[92m"
-YELLOW = "\033[93m"
-CYAN = "\033[96m"
-RED = "\033[91m"
-MAGENTA = "\033[95m"
-
-EVENT_COLORS = {
-    "START": CYAN,
-    "CONNECT": CYAN,
-    "HANDSHAKE": GREEN,
-    "STREAM": RESET,
-    "CID": MAGENTA,
-    "PATH": YELLOW,
-    "ERROR": RED,
-    "CLOSE": GREEN,
-    "FILE": CYAN,
-}
-
-
-def short_cid(cid) -> str:
-    if cid is None:
-        return "None"
-    if isinstance(cid, (bytes, bytearray)):
-        cid = cid.hex()
-    cid = str(cid)
-    return cid if len(cid) <= 16 else cid[:8] + "..." + cid[-4:]
-
-
-def log(role: str, event: str, message: str, *, use_color: bool = True) -> None:
-    now = datetime.now().strftime("%H:%M:%S")
-    color = EVENT_COLORS.get(event, RESET) if use_color else ""
-    reset = RESET if use_color else ""
-    print(f"{color}[{now}] [{role}] [{event}] {message}{reset}", flush=True)
-
-
-def banner(title: str, *, use_color: bool = True) -> None:
-    line = "=" * 72
-    if use_color:
-        print(f"{CYAN}\n{line}\n{title}\n{line}{RESET}", flush=True)
-    else:
-        print(f"\n{line}\n{title}\n{line}", flush=True)
-
-
-def write_qlog(quic_logger: Optional[QuicLogger], path: str) -> None:
-    if quic_logger is None:
-        return
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        if hasattr(quic_logger, "to_json"):
-            f.write(quic_logger.to_json())
-        elif hasattr(quic_logger, "to_dict"):
-            f.write(json.dumps(quic_logger.to_dict(), indent=2))
-        elif hasattr(quic_logger, "traces"):
-            f.write(json.dumps({"traces": quic_logger.traces}, indent=2))
-        else:
-            f.write(json.dumps({"error": "Unsupported QuicLogger API"}, indent=2))
-
-
-def make_clm_console_logger(role: str, *, use_color: bool = True):
-    def _console(event: dict) -> None:
-        event_name = event.get("event", "unknown")
-        detail = event.get("detail", {}) or {}
-        reason = event.get("reason")
-
-        if event_name == "clm_initialized":
-            log(
-                role,
-                "CID",
-                (
-                    "CLM ready: "
-                    f"policy={event.get('policy')} "
-                    f"current_cid={short_cid(detail.get('current_cid_hex'))}"
-                ),
-                use_color=use_color,
-            )
-        elif event_name == "rotate_ok":
-            trigger = reason or "unknown"
-            old_cid = short_cid(detail.get("old_cid_hex"))
-            new_cid = short_cid(detail.get("new_cid_hex"))
-            strategy = detail.get("strategy", "unknown")
-            log(role, "CID", f"Rotating CID (trigger={trigger}, strategy={strategy})", use_color=use_color)
-            log(role, "CID", f"old={old_cid} new={new_cid}", use_color=use_color)
-            retire_at = detail.get("retire_at")
-            if retire_at is not None:
-                seconds_left = max(0.0, retire_at - time.time())
-                log(role, "CID", f"Old CID enters grace period (~{seconds_left:.1f}s)", use_color=use_color)
-        elif event_name == "rotate_failed":
-            log(
-                role,
-                "ERROR",
-                f"CID rotation failed (trigger={reason or 'unknown'}): {detail.get('note', 'unknown error')}",
-                use_color=use_color,
-            )
-        elif event_name == "rotate_skipped":
-            log(
-                role,
-                "CID",
-                f"CID rotation skipped (trigger={reason or 'unknown'}): {detail.get('note', 'guard active')}",
-                use_color=use_color,
-            )
-        elif event_name == "retire_connection_id_emitted":
-            log(
-                role,
-                "CID",
-                f"Retired old CID: {short_cid(detail.get('cid_hex'))}",
-                use_color=use_color,
-            )
-        elif event_name == "retire_connection_id_failed":
-            log(
-                role,
-                "ERROR",
-                f"Failed to retire old CID {short_cid(detail.get('cid_hex'))}: {detail.get('note', 'unknown error')}",
-                use_color=use_color,
-            )
-    return _console
+from common import banner, log, make_clm_console_logger, open_secrets_log, preview_bytes, write_qlog
 
 
 class ClientProtocol(QuicConnectionProtocol):
@@ -137,23 +24,31 @@ class ClientProtocol(QuicConnectionProtocol):
         super().__init__(*args, **kwargs)
         self._clm = clm
         self._use_color = use_color
-        self._recv_q: asyncio.Queue[tuple[int, bytes, bool]] = asyncio.Queue()
-        self._ticker_task = asyncio.create_task(self._ticker())
+        self._have_data = asyncio.Event()
+        self._tick_handle: Optional[asyncio.TimerHandle] = None
         self._handshake_logged = False
         self._protocol_logged = False
-
-    async def _ticker(self):
-        try:
-            while True:
-                await asyncio.sleep(0.2)
-                if self._clm is not None:
-                    self._clm.tick(self)
-        except asyncio.CancelledError:
-            return
+        self._dispatch = {
+            ProtocolNegotiated: self._on_protocol_negotiated,
+            HandshakeCompleted: self._on_handshake_completed,
+            StreamDataReceived: self._on_stream_data,
+            ConnectionTerminated: self._on_connection_terminated,
+        }
+
+        if self._clm is not None:
+            self._tick_handle = self._loop.call_later(CidLifecycleManager.POLL_INTERVAL_S, self._on_tick)
+
+    def _on_tick(self):
+        self._tick_handle = None
+        self._clm.tick(self)
+        when = self._clm.next_tick_at()
+        if when < float("inf"):
+            self._tick_handle = self._loop.call_at(when, self._on_tick)
 
     def connection_lost(self, exc):
-        if self._ticker_task:
-            self._ticker_task.cancel()
+        if self._tick_handle is not None:
+            self._tick_handle.cancel()
+            self._tick_handle = None
         if exc is None:
             log("CLIENT", "CLOSE", "Connection closed", use_color=self._use_color)
         else:
@@ -161,48 +56,52 @@ class ClientProtocol(QuicConnectionProtocol):
         return super().connection_lost(exc)
 
     def quic_event_received(self, event):
-        name = event.__class__.__name__
+        handler = self._dispatch.get(event.__class__)
+        if handler is not None:
+            handler(event)
 
-        if name == "ProtocolNegotiated" and not self._protocol_logged:
-            alpn = getattr(event, "alpn_protocol", None)
-            if alpn is not None:
-                log("CLIENT", "HANDSHAKE", f"ALPN negotiated: {alpn}", use_color=self._use_color)
-            self._protocol_logged = True
+    def _on_protocol_negotiated(self, event):
+        if self._protocol_logged:
+            return
+        alpn = getattr(event, "alpn_protocol", None)
+        if alpn is not None:
+            log("CLIENT", "HANDSHAKE", f"ALPN negotiated: {alpn}", use_color=self._use_color)
+        self._protocol_logged = True
 
-        elif name == "HandshakeCompleted" and not self._handshake_logged:
-            resumed = getattr(event, "session_resumed", False)
-            early_data = getattr(event, "early_data_accepted", False)
+    def _on_handshake_completed(self, event):
+        if self._handshake_logged:
+            return
+        resumed = getattr(event, "session_resumed", False)
+        early_data = getattr(event, "early_data_accepted", False)
+        log(
+            "CLIENT",
+            "HANDSHAKE",
+            f"Handshake completed (resumed={resumed}, early_data={early_data})",
+            use_color=self._use_color,
+        )
+        self._handshake_logged = True
+
+    def _on_stream_data(self, event):
+        if getattr(event, "data", b""):
+            preview = preview_bytes(event.data)
             log(
                 "CLIENT",
-                "HANDSHAKE",
-                f"Handshake completed (resumed={resumed}, early_data={early_data})",
+                "STREAM",
+                f"Received echo on stream {event.stream_id}: {preview}",
                 use_color=self._use_color,
             )
-            self._handshake_logged = True
-
-        elif name == "StreamDataReceived":
-            if getattr(event, "data", b""):
-                preview = event.data.decode("utf-8", errors="replace").strip()
-                if len(preview) > 80:
-                    preview = preview[:77] + "..."
-                log(
-                    "CLIENT",
-                    "STREAM",
-                    f"Received echo on stream {event.stream_id}: {preview}",
-                    use_color=self._use_color,
-                )
-            self._recv_q.put_nowait((event.stream_id, event.data, event.end_stream))
+        self._have_data.set()
 
-        elif name == "ConnectionTerminated":
-            error_code = getattr(event, "error_code", None)
-            frame_type = getattr(event, "frame_type", None)
-            reason = getattr(event, "reason_phrase", "")
-            log(
-                "CLIENT",
-                "CLOSE",
-                f"Connection terminated (error_code={error_code}, frame_type={frame_type}, reason={reason!r})",
-                use_color=self._use_color,
-            )
+    def _on_connection_terminated(self, event):
+        error_code = getattr(event, "error_code", None)
+        frame_type = getattr(event, "frame_type", None)
+        reason = getattr(event, "reason_phrase", "")
+        log(
+            "CLIENT",
+            "CLOSE",
+            f"Connection terminated (error_code={error_code}, frame_type={frame_type}, reason={reason!r})",
+            use_color=self._use_color,
+        )
 
 
 async def main():
@@ -247,7 +146,7 @@ async def main():
 
     configuration = QuicConfiguration(is_client=True, alpn_protocols=[args.alpn])
     configuration.verify_mode = ssl.CERT_NONE
-    configuration.secrets_log_file = open(args.secrets_log, "a", encoding="utf-8")
+    configuration.secrets_log_file = open_secrets_log(args.secrets_log)
 
     quic_logger = QuicLogger()
     configuration.quic_logger = quic_logger
@@ -301,11 +200,14 @@ async def main():
             preview = payload[:80].decode("utf-8", errors="replace").strip()
             log("CLIENT", "STREAM", f"Sent on stream {stream_id}: {preview}", use_color=use_color)
 
+            # Clear before sending so late chunks of the previous echo cannot
+            # satisfy the wait for this one.
+            protocol._have_data.clear()
             protocol._quic.send_stream_data(stream_id, payload, end_stream=False)
             protocol.transmit()
 
             try:
-                await asyncio.wait_for(protocol._recv_q.get(), timeout=1.0)
+                await asyncio.wait_for(protocol._have_data.wait(), timeout=1.0)
             except asyncio.TimeoutError:
                 log("CLIENT", "ERROR", "Timed out waiting for echo", use_color=use_color)
 
@@ -345,6 +247,7 @@ async def main():
     except Exception:
         pass
 
+    clm.close()
     write_qlog(quic_logger, qlog_path)
     log("CLIENT", "FILE", f"qlog saved: {qlog_path}", use_color=use_color)
     log("CLIENT", "FILE", f"rotation log: {rotation_log_path}", use_color=use_color)
@@ -0,0 +1,219 @@
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from aioquic.quic.logger import QLOG_VERSION, QuicLogger, QuicLoggerTrace
+
+from cid_lifecycle import AsyncFileWriter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+RESET = "\033[0m"
+GREEN = "\033[92m"
+YELLOW = "\033[93m"
+CYAN = "\033[96m"
+RED = "\033[91m"
+MAGENTA = "\033[95m"
+
+EVENT_COLORS = {
+    "START": CYAN,
+    "CONNECT": CYAN,
+    "HANDSHAKE": GREEN,
+    "STREAM": RESET,
+    "CID": MAGENTA,
+    "PATH": YELLOW,
+    "ERROR": RED,
+    "CLOSE": GREEN,
+    "FILE": CYAN,
+    "CLI": YELLOW,
+}
+
+
+def short_cid(cid) -> str:
+    if cid is None:
+        return "None"
+    if isinstance(cid, (bytes, bytearray)):
+        cid = cid.hex()
+    cid = str(cid)
+    return cid if len(cid) <= 16 else cid[:8] + "..." + cid[-4:]
+
+
+def preview_bytes(data: bytes, limit: int = 80) -> str:
+    # Decode at most 4 bytes per displayed character (UTF-8 worst case), so
+    # large payloads are not decoded in full just to show the first line.
+    preview = data[: limit * 4].decode("utf-8", errors="replace").strip()
+    if len(preview) > limit:
+        preview = preview[: limit - 3] + "..."
+    return preview
+
+
+def log(role: str, event: str, message: str, *, use_color: bool = True) -> None:
+    now = datetime.now().strftime("%H:%M:%S")
+    color = EVENT_COLORS.get(event, RESET) if use_color else ""
+    reset = RESET if use_color else ""
+    print(f"{color}[{now}] [{role}] [{event}] {message}{reset}", flush=True)
+
+
+def banner(title: str, *, use_color: bool = True) -> None:
+    line = "=" * 72
+    if use_color:
+        print(f"{CYAN}\n{line}\n{title}\n{line}{RESET}", flush=True)
+    else:
+        print(f"\n{line}\n{title}\n{line}", flush=True)
+
+
+class RingQuicLogger(QuicLogger):
+    """
+    In-memory QuicLogger with bounded memory: each trace keeps only its most
+    recent max_events events, and only the last max_traces traces are kept.
+    """
+
+    def __init__(self, max_events: int = 50_000, max_traces: int = 256) -> None:
+        super().__init__()
+        self.max_events = max_events
+        self._traces = deque(maxlen=max_traces)
+
+    def start_trace(self, is_client: bool, odcid: bytes) -> QuicLoggerTrace:
+        trace = super().start_trace(is_client=is_client, odcid=odcid)
+        trace._events = deque(trace._events, maxlen=self.max_events)
+        return trace
+
+    def end_trace(self, trace: QuicLoggerTrace) -> None:
+        # The base class asserts the trace is still held, which no longer
+        # holds once it has been evicted from the ring.
+        pass
+
+
+def _dump_trace(trace: QuicLoggerTrace) -> bytes:
+    trace_dict = trace.to_dict()
+    if orjson is not None:
+        try:
+            return orjson.dumps(trace_dict, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(trace_dict, separators=(",", ":")).encode("utf-8")
+
+
+def write_qlog(quic_logger: Optional[QuicLogger], path: str) -> None:
+    if quic_logger is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    traces = getattr(quic_logger, "_traces", None)
+    if traces is not None:
+        # Encode one trace at a time so peak memory is a single trace, not
+        # the whole document; the file is still one valid qlog JSON object.
+        with open(path, "wb") as f:
+            f.write(b'{"qlog_format":"JSON","qlog_version":"%s","traces":[' % QLOG_VERSION.encode())
+            for i, trace in enumerate(list(traces)):
+                if i:
+                    f.write(b",")
+                f.write(_dump_trace(trace))
+            f.write(b"]}\n")
+        return
+
+    with open(path, "w", encoding="utf-8") as f:
+        if hasattr(quic_logger, "to_json"):
+            f.write(quic_logger.to_json())
+        elif hasattr(quic_logger, "to_dict"):
+            # json.dump() encodes in chunks instead of building the whole
+            # document as one string first.
+            json.dump(quic_logger.to_dict(), f, indent=2)
+        elif hasattr(quic_logger, "traces"):
+            json.dump({"traces": quic_logger.traces}, f, indent=2)
+        else:
+            json.dump({"error": "Unsupported QuicLogger API"}, f, indent=2)
+
+
+class SecretsLogFile:
+    """
+    Minimal text file object for QuicConfiguration.secrets_log_file.
+
+    aioquic writes and flushes one line per secret; here write() just encodes
+    and queues the line for a background AsyncFileWriter, and flush() is a
+    no-op, so key logging never blocks the event loop on disk I/O.
+    """
+
+    def __init__(self, writer: AsyncFileWriter):
+        self._writer = writer
+
+    def write(self, s: str) -> int:
+        self._writer.write(s.encode("utf-8"))
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def open_secrets_log(path: str) -> SecretsLogFile:
+    """Open a TLS secrets log (mode 0600) for appending from a background thread."""
+    return SecretsLogFile(AsyncFileWriter.for_path(path, mode=0o600))
+
+
+def make_clm_console_logger(role: str, *, use_color: bool = True):
+    def _console(event: dict) -> None:
+        event_name = event.get("event", "unknown")
+        detail = event.get("detail", {}) or {}
+        reason = event.get("reason")
+
+        if event_name == "clm_initialized":
+            log(
+                role,
+                "CID",
+                (
+                    "CLM ready: "
+                    f"policy={event.get('policy')} "
+                    f"current_cid={short_cid(detail.get('current_cid_hex'))}"
+                ),
+                use_color=use_color,
+            )
+        elif event_name == "rotate_ok":
+            trigger = reason or "unknown"
+            old_cid = short_cid(detail.get("old_cid_hex"))
+            new_cid = short_cid(detail.get("new_cid_hex"))
+            strategy = detail.get("strategy", "unknown")
+            log(role, "CID", f"Rotating CID (trigger={trigger}, strategy={strategy})", use_color=use_color)
+            log(role, "CID", f"old={old_cid} new={new_cid}", use_color=use_color)
+            retire_at = detail.get("retire_at")
+            if retire_at is not None:
+                seconds_left = max(0.0, retire_at - time.time())
+                log(role, "CID", f"Old CID enters grace period (~{seconds_left:.1f}s)", use_color=use_color)
+        elif event_name == "rotate_failed":
+            log(
+                role,
+                "ERROR",
+                f"CID rotation failed (trigger={reason or 'unknown'}): {detail.get('note', 'unknown error')}",
+                use_color=use_color,
+            )
+        elif event_name == "rotate_skipped":
+            log(
+                role,
+                "CID",
+                f"CID rotation skipped (trigger={reason or 'unknown'}): {detail.get('note', 'guard active')}",
+                use_color=use_color,
+            )
+        elif event_name == "retire_connection_id_emitted":
+            log(
+                role,
+                "CID",
+                f"Retired old CID: {short_cid(detail.get('cid_hex'))}",
+                use_color=use_color,
+            )
+        elif event_name == "retire_connection_id_failed":
+            log(
+                role,
+                "ERROR",
+                f"Failed to retire old CID {short_cid(detail.get('cid_hex'))}: {detail.get('note', 'unknown error')}",
+                use_color=use_color,
+            )
+    return _console
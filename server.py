@@ -1,75 +1,40 @@
 import argparse
 import asyncio
-import json
 import os
+import signal
+import sys
 import time
+import traceback
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Dict, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set
 
-from aioquic.asyncio import QuicConnectionProtocol, serve
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from aioquic.asyncio import QuicConnectionProtocol
+from aioquic.asyncio.server import QuicServer
 from aioquic.quic.configuration import QuicConfiguration
-from aioquic.quic.logger import QuicLogger
-
-from cid_lifecycle import CidLifecycleManager, RotationPolicy
-
-
-RESET = "\033[0m"
-GREEN = "\033[92m"
-YELLOW = "\033[93m"
-CYAN = "\033[96m"
-RED = "\033[91m"
-MAGENTA = "\033[95m"
-
-EVENT_COLORS = {
-    "START": CYAN,
-    "CONNECT": CYAN,
-    "HANDSHAKE": GREEN,
-    "STREAM": RESET,
-    "CID": MAGENTA,
-    "PATH": YELLOW,
-    "ERROR": RED,
-    "CLOSE": GREEN,
-    "FILE": CYAN,
-    "CLI": YELLOW,
-}
-
-
-def short_cid(cid) -> str:
-    if cid is None:
-        return "None"
-    if isinstance(cid, (bytes, bytearray)):
-        cid = cid.hex()
-    cid = str(cid)
-    return cid if len(cid) <= 16 else cid[:8] + "..." + cid[-4:]
-
-
-def log(role: str, event: str, message: str, *, use_color: bool = True) -> None:
-    now = datetime.now().strftime("%H:%M:%S")
-    color = EVENT_COLORS.get(event, RESET) if use_color else ""
-    reset = RESET if use_color else ""
-    print(f"{color}[{now}] [{role}] [{event}] {message}{reset}", flush=True)
-
-
-def banner(title: str, *, use_color: bool = True) -> None:
-    line = "=" * 72
-    if use_color:
-        print(f"{CYAN}\n{line}\n{title}\n{line}{RESET}", flush=True)
-    else:
-        print(f"\n{line}\n{title}\n{line}", flush=True)
-
-
-def write_qlog(quic_logger: QuicLogger, path: str) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        if hasattr(quic_logger, "to_json"):
-            f.write(quic_logger.to_json())
-        elif hasattr(quic_logger, "to_dict"):
-            f.write(json.dumps(quic_logger.to_dict(), indent=2))
-        elif hasattr(quic_logger, "traces"):
-            f.write(json.dumps({"traces": quic_logger.traces}, indent=2))
-        else:
-            f.write(json.dumps({"error": "Unsupported QuicLogger API"}, indent=2))
+from aioquic.quic.events import (
+    ConnectionTerminated,
+    HandshakeCompleted,
+    ProtocolNegotiated,
+    StreamDataReceived,
+)
+from aioquic.quic.logger import QuicFileLogger, QuicLogger
+
+from cid_lifecycle import AsyncFileWriter, CidLifecycleManager, RotationPolicy
+from common import (
+    RingQuicLogger,
+    banner,
+    log,
+    make_clm_console_logger,
+    open_secrets_log,
+    preview_bytes,
+    write_qlog,
+)
+from udp_batch import install_batching_sender, install_mmsg_receiver, set_incoming_cpu, set_socket_buffers
 
 
 def ensure_cert(cert_path: str, key_path: str):
@@ -81,87 +46,117 @@ def ensure_cert(cert_path: str, key_path: str):
         )
 
 
-def make_clm_console_logger(role: str, *, use_color: bool = True):
-    def _console(event: dict) -> None:
-        event_name = event.get("event", "unknown")
-        detail = event.get("detail", {}) or {}
-        reason = event.get("reason")
-
-        if event_name == "clm_initialized":
-            log(
-                role,
-                "CID",
-                (
-                    "CLM ready: "
-                    f"policy={event.get('policy')} "
-                    f"current_cid={short_cid(detail.get('current_cid_hex'))}"
-                ),
-                use_color=use_color,
-            )
-        elif event_name == "rotate_ok":
-            trigger = reason or "unknown"
-            old_cid = short_cid(detail.get("old_cid_hex"))
-            new_cid = short_cid(detail.get("new_cid_hex"))
-            strategy = detail.get("strategy", "unknown")
-            log(role, "CID", f"Rotating CID (trigger={trigger}, strategy={strategy})", use_color=use_color)
-            log(role, "CID", f"old={old_cid} new={new_cid}", use_color=use_color)
-            retire_at = detail.get("retire_at")
-            if retire_at is not None:
-                seconds_left = max(0.0, retire_at - time.time())
-                log(role, "CID", f"Old CID enters grace period (~{seconds_left:.1f}s)", use_color=use_color)
-        elif event_name == "rotate_failed":
-            log(
-                role,
-                "ERROR",
-                f"CID rotation failed (trigger={reason or 'unknown'}): {detail.get('note', 'unknown error')}",
-                use_color=use_color,
-            )
-        elif event_name == "rotate_skipped":
-            log(
-                role,
-                "CID",
-                f"CID rotation skipped (trigger={reason or 'unknown'}): {detail.get('note', 'guard active')}",
-                use_color=use_color,
-            )
-        elif event_name == "retire_connection_id_emitted":
-            log(
-                role,
-                "CID",
-                f"Retired old CID: {short_cid(detail.get('cid_hex'))}",
-                use_color=use_color,
-            )
-        elif event_name == "retire_connection_id_failed":
-            log(
-                role,
-                "ERROR",
-                f"Failed to retire old CID {short_cid(detail.get('cid_hex'))}: {detail.get('note', 'unknown error')}",
-                use_color=use_color,
-            )
-    return _console
-
-
 @dataclass
 class ServerRuntime:
     policy: RotationPolicy
     rotation_log: str
     use_color: bool
+    stream_log: bool = True
+    ticker: Optional["ClmTicker"] = None
+
+
+class ConnectionRegistry:
+    """
+    Live server connections, kept as an intrusive doubly-linked list through
+    each protocol's _registry_prev/_registry_next fields.
+
+    add() and discard() are O(1) pointer updates with no hashing, len() is a
+    maintained counter, and iteration allocates nothing. Connections may be
+    discarded (or added) while the registry is being iterated: a removed node
+    keeps its forward link, and iteration skips nodes no longer registered.
+    """
+
+    __slots__ = ("_head", "_count")
+
+    def __init__(self):
+        self._head: Optional["EchoServerProtocol"] = None
+        self._count = 0
+
+    def add(self, p: "EchoServerProtocol") -> None:
+        if p._registered:
+            return
+        p._registered = True
+        p._registry_prev = None
+        p._registry_next = self._head
+        if self._head is not None:
+            self._head._registry_prev = p
+        self._head = p
+        self._count += 1
+
+    def discard(self, p: "EchoServerProtocol") -> None:
+        if not p._registered:
+            return
+        p._registered = False
+        prev, nxt = p._registry_prev, p._registry_next
+        if prev is None:
+            self._head = nxt
+        else:
+            prev._registry_next = nxt
+        if nxt is not None:
+            nxt._registry_prev = prev
+        p._registry_prev = None
+        self._count -= 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator["EchoServerProtocol"]:
+        node = self._head
+        while node is not None:
+            if node._registered:
+                yield node
+            node = node._registry_next
 
 
 class EchoServerProtocol(QuicConnectionProtocol):
+    # QuicConnectionProtocol still has a __dict__; slots keep this class's
+    # per-event fields out of it and make their lookups descriptor-fast.
+    __slots__ = (
+        "_runtime",
+        "_registry",
+        "_registered",
+        "_registry_prev",
+        "_registry_next",
+        "_use_color",
+        "_stream_log",
+        "_handshake_logged",
+        "_protocol_logged",
+        "_pending_echo",
+        "_pending_echo_end",
+        "_echo_scheduled",
+        "_dispatch",
+        "_clm",
+        "_clm_due",
+        "_released",
+    )
+
     def __init__(
         self,
         *args,
         runtime: ServerRuntime,
-        registry: Set["EchoServerProtocol"],
+        registry: ConnectionRegistry,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self._runtime = runtime
         self._registry = registry
+        self._registered = False
+        self._released = False
+        self._registry_prev: Optional[EchoServerProtocol] = None
+        self._registry_next: Optional[EchoServerProtocol] = None
         self._use_color = runtime.use_color
+        self._stream_log = runtime.stream_log
         self._handshake_logged = False
         self._protocol_logged = False
-        self._registry.add(self)
+        self._pending_echo: Dict[int, List[bytes]] = {}
+        self._pending_echo_end: Set[int] = set()
+        self._echo_scheduled = False
+        self._dispatch = {
+            ProtocolNegotiated: self._on_protocol_negotiated,
+            HandshakeCompleted: self._on_handshake_completed,
+            StreamDataReceived: self._on_stream_data,
+            ConnectionTerminated: self._on_connection_terminated,
+        }
 
         # IMPORTANT: one CLM per connection / protocol
         self._clm = CidLifecycleManager(
@@ -170,74 +165,108 @@ class EchoServerProtocol(QuicConnectionProtocol):
             role="server",
             console_callback=make_clm_console_logger("SERVER", use_color=self._use_color),
         )
+        # Loop time at which the shared ticker next needs to tick this CLM.
+        self._clm_due = 0.0
+        if runtime.ticker is not None:
+            runtime.ticker.wake(self)
+        # Register last, so a failure above never leaves a half-built
+        # protocol in the registry.
+        self._registry.add(self)
 
-        self._ticker_task = asyncio.create_task(self._ticker())
+    def quic_event_received(self, event):
+        handler = self._dispatch.get(event.__class__)
+        if handler is not None:
+            handler(event)
 
-    async def _ticker(self):
-        try:
-            while True:
-                await asyncio.sleep(0.2)
-                self._clm.tick(self)
-        except asyncio.CancelledError:
+    def _on_protocol_negotiated(self, event):
+        if self._protocol_logged:
             return
+        alpn = getattr(event, "alpn_protocol", None)
+        if alpn is not None:
+            log("SERVER", "HANDSHAKE", f"ALPN negotiated: {alpn}", use_color=self._use_color)
+        self._protocol_logged = True
 
-    def quic_event_received(self, event):
-        name = event.__class__.__name__
-
-        if name == "ProtocolNegotiated" and not self._protocol_logged:
-            alpn = getattr(event, "alpn_protocol", None)
-            if alpn is not None:
-                log("SERVER", "HANDSHAKE", f"ALPN negotiated: {alpn}", use_color=self._use_color)
-            self._protocol_logged = True
-
-        elif name == "HandshakeCompleted" and not self._handshake_logged:
-            resumed = getattr(event, "session_resumed", False)
-            early_data = getattr(event, "early_data_accepted", False)
-            log(
-                "SERVER",
-                "HANDSHAKE",
-                f"Handshake completed (resumed={resumed}, early_data={early_data})",
-                use_color=self._use_color,
-            )
-            self._handshake_logged = True
-
-        elif name == "StreamDataReceived":
-            if event.data:
-                preview = event.data.decode("utf-8", errors="replace").strip()
-                if len(preview) > 80:
-                    preview = preview[:77] + "..."
+    def _on_handshake_completed(self, event):
+        if self._handshake_logged:
+            return
+        resumed = getattr(event, "session_resumed", False)
+        early_data = getattr(event, "early_data_accepted", False)
+        log(
+            "SERVER",
+            "HANDSHAKE",
+            f"Handshake completed (resumed={resumed}, early_data={early_data})",
+            use_color=self._use_color,
+        )
+        self._handshake_logged = True
+
+    def _on_stream_data(self, event):
+        if event.data:
+            if self._stream_log:
                 log(
                     "SERVER",
                     "STREAM",
-                    f"Received on stream {event.stream_id}: {preview}",
+                    f"Received on stream {event.stream_id}: {preview_bytes(event.data)}",
                     use_color=self._use_color,
                 )
-                self._quic.send_stream_data(
-                    event.stream_id, event.data, end_stream=event.end_stream
-                )
-                self.transmit()
+            # Keep the received bytes objects as-is; they are copied exactly
+            # once, into aioquic's send buffer, when the echo is flushed.
+            chunks = self._pending_echo.get(event.stream_id)
+            if chunks is None:
+                self._pending_echo[event.stream_id] = [event.data]
+            else:
+                chunks.append(event.data)
+            if event.end_stream:
+                self._pending_echo_end.add(event.stream_id)
+            if not self._echo_scheduled:
+                self._echo_scheduled = True
+                self._loop.call_soon(self._flush_echo)
+
+    def _flush_echo(self):
+        # Everything received for a stream during one loop iteration is
+        # queued back in order, followed by one transmit for all streams.
+        self._echo_scheduled = False
+        pending, self._pending_echo = self._pending_echo, {}
+        ended, self._pending_echo_end = self._pending_echo_end, set()
+        send_stream_data = self._quic.send_stream_data
+        stream_log = self._stream_log
+        for stream_id, chunks in pending.items():
+            last = len(chunks) - 1
+            for i, chunk in enumerate(chunks):
+                send_stream_data(stream_id, chunk, end_stream=i == last and stream_id in ended)
+            if stream_log:
                 log(
                     "SERVER",
                     "STREAM",
-                    f"Echoed back on stream {event.stream_id}",
+                    f"Echoed back on stream {stream_id}",
                     use_color=self._use_color,
                 )
+        self.transmit()
+
+    def _on_connection_terminated(self, event):
+        error_code = getattr(event, "error_code", None)
+        frame_type = getattr(event, "frame_type", None)
+        reason = getattr(event, "reason_phrase", "")
+        log(
+            "SERVER",
+            "CLOSE",
+            f"Connection terminated (error_code={error_code}, frame_type={frame_type}, reason={reason!r})",
+            use_color=self._use_color,
+        )
+        self._release()
 
-        elif name == "ConnectionTerminated":
-            error_code = getattr(event, "error_code", None)
-            frame_type = getattr(event, "frame_type", None)
-            reason = getattr(event, "reason_phrase", "")
-            log(
-                "SERVER",
-                "CLOSE",
-                f"Connection terminated (error_code={error_code}, frame_type={frame_type}, reason={reason!r})",
-                use_color=self._use_color,
-            )
+    def _release(self):
+        # aioquic's QuicServer never calls connection_lost() on per-connection
+        # protocols, so teardown runs on ConnectionTerminated; guarded so the
+        # connection_lost() path (if it ever runs) is a no-op afterwards.
+        if self._released:
+            return
+        self._released = True
+        self._registry.discard(self)
+        self._clm_due = float("inf")
+        self._clm.close()
 
     def connection_lost(self, exc):
-        if hasattr(self, "_ticker_task"):
-            self._ticker_task.cancel()
-        self._registry.discard(self)
+        self._release()
         if exc is None:
             log("SERVER", "CLOSE", "Connection closed", use_color=self._use_color)
         else:
@@ -245,30 +274,171 @@ class EchoServerProtocol(QuicConnectionProtocol):
         return super().connection_lost(exc)
 
 
-def force_rotate_all(protocols: Set[EchoServerProtocol], *, use_color: bool = True) -> None:
-    count = 0
-    for p in list(protocols):
-        try:
-            p._clm.force_rotate(p, reason="manual")
-            count += 1
-        except Exception as e:
-            log("SERVER", "ERROR", f"Manual rotate failed: {type(e).__name__}: {e}", use_color=use_color)
-    log("SERVER", "CLI", f"Manual rotate requested for {count} connection(s)", use_color=use_color)
+class ClmTicker:
+    """
+    Drives every connection's CLM from one loop timer, instead of a sleeping
+    task per connection.
+
+    The timer is armed for the earliest CidLifecycleManager.next_tick_at()
+    across connections, and each wakeup ticks only the CLMs that are due.
+    Baseline connections with nothing pending cost no wakeups at all; with
+    no connections the timer is idle until wake().
+    """
+
+    def __init__(self, protocols: ConnectionRegistry, *, use_color: bool = True):
+        self._protocols = protocols
+        self._use_color = use_color
+        self._loop = asyncio.get_running_loop()
+        self._handle: Optional[asyncio.Handle] = None
+        # Deadline self._handle is armed for. Tracked here because uvloop's
+        # call_at() returns a plain Handle (no .when()) for past deadlines.
+        self._armed_when = float("inf")
+
+    def wake(self, p: Optional[EchoServerProtocol] = None) -> None:
+        """Tick p (or every connection) on the next loop iteration, e.g. after it was created or rotated."""
+        if p is not None:
+            p._clm_due = 0.0
+        else:
+            for q in self._protocols:
+                q._clm_due = 0.0
+        self._arm(self._loop.time())
+
+    def _arm(self, when: float) -> None:
+        if self._handle is not None:
+            if self._armed_when <= when:
+                return
+            self._handle.cancel()
+        self._armed_when = when
+        self._handle = self._loop.call_later(max(0.0, when - self._loop.time()), self._on_tick)
+
+    def _on_tick(self):
+        self._handle = None
+        self._armed_when = float("inf")
+        now = self._loop.time()
+        earliest = float("inf")
+        for p in self._protocols:
+            due = p._clm_due
+            if due <= now:
+                clm = p._clm
+                try:
+                    clm.tick(p)
+                except Exception as e:
+                    log("SERVER", "ERROR", f"CLM tick failed: {type(e).__name__}: {e}", use_color=self._use_color)
+                due = p._clm_due = clm.next_tick_at()
+            if due < earliest:
+                earliest = due
+        if earliest < float("inf"):
+            self._arm(earliest)
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            self._armed_when = float("inf")
+
+
+def _rotate_one(p: EchoServerProtocol, use_color: bool) -> None:
+    if not p._registered:
+        return
+    try:
+        p._clm.force_rotate(p, reason="manual")
+    except Exception as e:
+        log("SERVER", "ERROR", f"Manual rotate failed: {type(e).__name__}: {e}", use_color=use_color)
+
+
+def _path_change_one(p: EchoServerProtocol, tag: str, use_color: bool) -> None:
+    if not p._registered:
+        return
+    try:
+        p._clm.on_path_validated(p, path_id=tag, old_path_id="manual-trigger")
+    except Exception as e:
+        log("SERVER", "ERROR", f"Path-change rotate failed: {type(e).__name__}: {e}", use_color=use_color)
+
+
+def force_rotate_all(protocols: ConnectionRegistry, *, use_color: bool = True) -> None:
+    # Each rotation runs as its own loop callback, so the CLI returns at once
+    # and packet processing interleaves with a large batch. Connections that
+    # close before their turn are skipped.
+    call_soon = asyncio.get_running_loop().call_soon
+    for p in protocols:
+        call_soon(_rotate_one, p, use_color)
+    log("SERVER", "CLI", f"Manual rotate requested for {len(protocols)} connection(s)", use_color=use_color)
 
 
-def simulate_path_change_all(protocols: Set[EchoServerProtocol], *, use_color: bool = True) -> None:
-    count = 0
+def simulate_path_change_all(protocols: ConnectionRegistry, *, use_color: bool = True) -> None:
+    call_soon = asyncio.get_running_loop().call_soon
     tag = f"simulated-path-{int(time.time())}"
-    for p in list(protocols):
-        try:
-            p._clm.on_path_validated(p, path_id=tag, old_path_id="manual-trigger")
-            count += 1
-        except Exception as e:
-            log("SERVER", "ERROR", f"Path-change rotate failed: {type(e).__name__}: {e}", use_color=use_color)
-    log("SERVER", "PATH", f"Simulated validated path change requested for {count} connection(s)", use_color=use_color)
+    for p in protocols:
+        call_soon(_path_change_one, p, tag, use_color)
+    log(
+        "SERVER",
+        "PATH",
+        f"Simulated validated path change requested for {len(protocols)} connection(s)",
+        use_color=use_color,
+    )
+
 
+class StdinReader:
+    """
+    Reads stdin lines from the event loop via add_reader(), instead of an
+    executor job per input() call. POSIX only; see open().
+    """
 
-async def cli_loop(protocols: Set[EchoServerProtocol], runtime: ServerRuntime):
+    def __init__(self, loop: asyncio.AbstractEventLoop, fd: int):
+        self._loop = loop
+        self._fd = fd
+        self._buf = bytearray()
+        self._lines: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self._eof = False
+        loop.add_reader(fd, self._on_readable)
+
+    @classmethod
+    def open(cls) -> Optional["StdinReader"]:
+        """Return a reader for stdin, or None where the loop cannot watch it (Windows, regular files)."""
+        try:
+            return cls(asyncio.get_running_loop(), sys.stdin.fileno())
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            return None
+
+    def _on_readable(self):
+        data = os.read(self._fd, 4096)
+        if not data:
+            if self._buf:
+                self._lines.put_nowait(self._buf.decode("utf-8", errors="replace"))
+                self._buf.clear()
+            self._lines.put_nowait(None)
+            self.close()
+            return
+
+        self._buf += data
+        start = 0
+        while True:
+            end = self._buf.find(b"\n", start)
+            if end < 0:
+                break
+            self._lines.put_nowait(self._buf[start:end].decode("utf-8", errors="replace"))
+            start = end + 1
+        del self._buf[:start]
+
+    async def readline(self, prompt: str = "") -> str:
+        """Like input(): print the prompt, return one line, raise EOFError at end of input."""
+        if self._eof:
+            raise EOFError
+        if prompt:
+            print(prompt, end="", flush=True)
+        line = await self._lines.get()
+        if line is None:
+            self._eof = True
+            raise EOFError
+        return line
+
+    def close(self):
+        if self._fd >= 0:
+            self._loop.remove_reader(self._fd)
+            self._fd = -1
+
+
+async def cli_loop(protocols: ConnectionRegistry, runtime: ServerRuntime):
     use_color = runtime.use_color
     help_text = (
         "\n[server cli] commands:\n"
@@ -281,43 +451,58 @@ async def cli_loop(protocols: Set[EchoServerProtocol], runtime: ServerRuntime):
     )
     print(help_text, flush=True)
 
-    while True:
-        cmd = (await asyncio.to_thread(input, "[server cli] > ")).strip().lower()
-
-        if cmd in ("help", "?"):
-            print(help_text, flush=True)
-        elif cmd == "status":
-            p = runtime.policy
-            log(
-                "SERVER",
-                "CLI",
-                (
-                    f"active_connections={len(protocols)} "
-                    f"policy={p.cid_policy} "
-                    f"time_interval={p.cid_time_interval_s}s "
-                    f"jitter_fraction={p.cid_jitter_fraction} "
-                    f"byte_threshold={p.cid_byte_threshold} "
-                    f"grace_period={p.cid_grace_period_s}s "
-                    f"min_gap={p.min_gap_s}s"
-                ),
-                use_color=use_color,
-            )
-        elif cmd in ("connections", "conn"):
-            log("SERVER", "CLI", f"Active connections: {len(protocols)}", use_color=use_color)
-        elif cmd in ("rotate", "r"):
-            force_rotate_all(protocols, use_color=use_color)
-        elif cmd in ("path-change", "path", "p"):
-            simulate_path_change_all(protocols, use_color=use_color)
-        elif cmd in ("quit", "exit", "q"):
-            log("SERVER", "CLOSE", "Shutting down server...", use_color=use_color)
-            return
-        elif cmd == "":
-            continue
-        else:
-            log("SERVER", "ERROR", "Unknown command. Type 'help'.", use_color=use_color)
+    stdin_reader = StdinReader.open()
+    if stdin_reader is not None:
+        read_line = stdin_reader.readline
+    else:
+        def read_line(prompt: str):
+            return asyncio.to_thread(input, prompt)
+
+    try:
+        while True:
+            cmd = (await read_line("[server cli] > ")).strip().lower()
 
+            if cmd in ("help", "?"):
+                print(help_text, flush=True)
+            elif cmd == "status":
+                p = runtime.policy
+                log(
+                    "SERVER",
+                    "CLI",
+                    (
+                        f"active_connections={len(protocols)} "
+                        f"policy={p.cid_policy} "
+                        f"time_interval={p.cid_time_interval_s}s "
+                        f"jitter_fraction={p.cid_jitter_fraction} "
+                        f"byte_threshold={p.cid_byte_threshold} "
+                        f"grace_period={p.cid_grace_period_s}s "
+                        f"min_gap={p.min_gap_s}s"
+                    ),
+                    use_color=use_color,
+                )
+            elif cmd in ("connections", "conn"):
+                log("SERVER", "CLI", f"Active connections: {len(protocols)}", use_color=use_color)
+            elif cmd in ("rotate", "r"):
+                force_rotate_all(protocols, use_color=use_color)
+                if runtime.ticker is not None:
+                    runtime.ticker.wake()
+            elif cmd in ("path-change", "path", "p"):
+                simulate_path_change_all(protocols, use_color=use_color)
+                if runtime.ticker is not None:
+                    runtime.ticker.wake()
+            elif cmd in ("quit", "exit", "q"):
+                log("SERVER", "CLOSE", "Shutting down server...", use_color=use_color)
+                return
+            elif cmd == "":
+                continue
+            else:
+                log("SERVER", "ERROR", "Unknown command. Type 'help'.", use_color=use_color)
+    finally:
+        if stdin_reader is not None:
+            stdin_reader.close()
 
-async def main():
+
+def parse_args() -> argparse.Namespace:
     ap = argparse.ArgumentParser()
 
     ap.add_argument("--host", default="0.0.0.0")
@@ -325,11 +510,56 @@ async def main():
     ap.add_argument("--cert", default="server.crt")
     ap.add_argument("--key", default="server.key")
     ap.add_argument("--qlog-dir", default="qlog")
+    ap.add_argument(
+        "--qlog",
+        choices=["off", "ring", "file"],
+        default="ring",
+        help="qlog mode: off, ring (bounded in-memory, written on exit), file (one file per connection)",
+    )
     ap.add_argument("--secrets-log", default="runs/server/secrets.log")
     ap.add_argument("--rotation-log", default="runs/server/rotation.jsonl")
     ap.add_argument("--alpn", default="hq-29", help="ALPN protocol (e.g., hq-29, h3, h3-29)")
     ap.add_argument("--demo", action="store_true", help="Enable presentation-friendly banners and logs")
     ap.add_argument("--no-color", action="store_true", help="Disable ANSI colors in terminal output")
+    ap.add_argument(
+        "--no-stream-log",
+        action="store_true",
+        help="Skip the per-message STREAM console lines (and payload previews) on the echo path",
+    )
+    ap.add_argument(
+        "--so-rcvbuf",
+        type=int,
+        default=16 * 1024 * 1024,
+        help="UDP socket receive buffer in bytes (0 keeps the kernel default)",
+    )
+    ap.add_argument(
+        "--so-sndbuf",
+        type=int,
+        default=16 * 1024 * 1024,
+        help="UDP socket send buffer in bytes (0 keeps the kernel default)",
+    )
+    ap.add_argument(
+        "--no-udp-batch",
+        action="store_true",
+        help="Use one syscall per datagram instead of UDP GSO sends and recvmmsg receives (Linux)",
+    )
+    ap.add_argument(
+        "--uvloop",
+        action="store_true",
+        help="Run on uvloop instead of the stdlib loop (disables the GSO/recvmmsg/GRO socket batching)",
+    )
+    ap.add_argument(
+        "--cpu",
+        type=int,
+        default=None,
+        help="Pin the server (worker i: CPU N+i) to this CPU and steer its socket with SO_INCOMING_CPU (Linux)",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of server processes sharing the port via SO_REUSEPORT (POSIX)",
+    )
 
     ap.add_argument("--cid-policy", choices=["baseline", "clm"], default="clm")
     ap.add_argument("--cid-time-interval", type=float, default=15.0)
@@ -340,24 +570,54 @@ async def main():
     ap.add_argument("--cid-random-seed", type=int, default=None)
 
     args = ap.parse_args()
-    use_color = not args.no_color
+    if args.uvloop and uvloop is None:
+        ap.error("--uvloop requires the uvloop package (pip install uvloop)")
+    if args.workers < 1:
+        ap.error("--workers must be at least 1")
+    if args.workers > 1 and not hasattr(os, "fork"):
+        ap.error("--workers > 1 requires os.fork()")
+    return args
+
 
+def build_config(args: argparse.Namespace) -> QuicConfiguration:
+    """Load the certificate once, before forking, so workers inherit the parsed chain."""
     ensure_cert(args.cert, args.key)
+    config = QuicConfiguration(
+        is_client=False,
+        alpn_protocols=[args.alpn],
+    )
+    config.load_cert_chain(args.cert, args.key)
+    return config
+
+
+async def wait_for_termination():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+
+async def main(args: argparse.Namespace, config: QuicConfiguration, worker_index: int = 0):
+    # Worker 0 runs the CLI; extra workers run headless until SIGTERM.
+    use_color = not args.no_color
+    headless = worker_index > 0
+
     os.makedirs(args.qlog_dir, exist_ok=True)
     os.makedirs(os.path.dirname(args.secrets_log), exist_ok=True)
     os.makedirs(os.path.dirname(args.rotation_log), exist_ok=True)
 
-    if args.demo:
+    if args.demo and not headless:
         banner("QUIC SERVER DEMO", use_color=use_color)
 
-    quic_logger = QuicLogger()
-    config = QuicConfiguration(
-        is_client=False,
-        alpn_protocols=[args.alpn],
-        quic_logger=quic_logger,
-    )
-    config.load_cert_chain(args.cert, args.key)
-    config.secrets_log_file = open(args.secrets_log, "a", encoding="utf-8")
+    quic_logger: Optional[QuicLogger] = None
+    if args.qlog == "ring":
+        quic_logger = RingQuicLogger()
+    elif args.qlog == "file":
+        quic_logger = QuicFileLogger(args.qlog_dir)
+
+    config.quic_logger = quic_logger
+    config.secrets_log_file = open_secrets_log(args.secrets_log)
 
     runtime = ServerRuntime(
         policy=RotationPolicy(
@@ -371,42 +631,148 @@ async def main():
         ),
         rotation_log=args.rotation_log,
         use_color=use_color,
+        stream_log=not args.no_stream_log,
     )
 
-    active_protocols: Set[EchoServerProtocol] = set()
-
-    server = await serve(
-        args.host,
-        args.port,
-        configuration=config,
-        create_protocol=lambda *p, **kw: EchoServerProtocol(
-            *p, runtime=runtime, registry=active_protocols, **kw
+    active_protocols = ConnectionRegistry()
+    runtime.ticker = ClmTicker(active_protocols, use_color=use_color)
+
+    # Same as aioquic's serve(), plus SO_REUSEPORT so several workers can
+    # bind the port and the kernel spreads peers across them.
+    _, server = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: QuicServer(
+            configuration=config,
+            create_protocol=lambda *p, **kw: EchoServerProtocol(
+                *p, runtime=runtime, registry=active_protocols, **kw
+            ),
         ),
+        local_addr=(args.host, args.port),
+        reuse_port=args.workers > 1,
     )
 
+    sock = server._transport.get_extra_info("socket")
+    rcvbuf, sndbuf = set_socket_buffers(sock, args.so_rcvbuf, args.so_sndbuf)
+
+    cpu = None
+    incoming_cpu = False
+    if args.cpu is not None and hasattr(os, "sched_setaffinity"):
+        cpu = args.cpu + worker_index
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError as e:
+            log("SERVER", "ERROR", f"Cannot pin to CPU {cpu}: {e}", use_color=use_color)
+            cpu = None
+        else:
+            incoming_cpu = set_incoming_cpu(sock, cpu)
+
+    batch_sender = None
+    mmsg_receiver = None
+    if not args.no_udp_batch:
+        batch_sender = install_batching_sender(server._transport)
+        mmsg_receiver = install_mmsg_receiver(server._transport)
+
     log("SERVER", "START", f"Listening on {args.host}:{args.port}", use_color=use_color)
-    log("SERVER", "FILE", f"qlog dir: {args.qlog_dir} (written on exit)", use_color=use_color)
+    if args.workers > 1:
+        log("SERVER", "START", f"Worker {worker_index + 1}/{args.workers} (pid {os.getpid()})", use_color=use_color)
+    loop_name = "uvloop" if uvloop is not None and isinstance(asyncio.get_running_loop(), uvloop.Loop) else "asyncio"
+    log("SERVER", "START", f"Event loop: {loop_name}", use_color=use_color)
+    log(
+        "SERVER",
+        "START",
+        (
+            f"UDP batching: send={'GSO' if batch_sender is not None else 'off'} "
+            f"recv={'off' if mmsg_receiver is None else 'recvmmsg+GRO' if mmsg_receiver.gro_enabled else 'recvmmsg'}"
+        ),
+        use_color=use_color,
+    )
+    log("SERVER", "START", f"UDP socket buffers: rcvbuf={rcvbuf} sndbuf={sndbuf}", use_color=use_color)
+    if cpu is not None:
+        log(
+            "SERVER",
+            "START",
+            f"Pinned to CPU {cpu} (SO_INCOMING_CPU {'on' if incoming_cpu else 'unavailable'})",
+            use_color=use_color,
+        )
+    if args.qlog == "ring":
+        log("SERVER", "FILE", f"qlog dir: {args.qlog_dir} (written on exit)", use_color=use_color)
+    elif args.qlog == "file":
+        log("SERVER", "FILE", f"qlog dir: {args.qlog_dir} (one file per closed connection)", use_color=use_color)
+    else:
+        log("SERVER", "FILE", "qlog: off", use_color=use_color)
     log("SERVER", "FILE", f"secrets log: {args.secrets_log}", use_color=use_color)
     log("SERVER", "FILE", f"rotation log: {args.rotation_log}", use_color=use_color)
 
     try:
-        await cli_loop(active_protocols, runtime)
+        if headless:
+            await wait_for_termination()
+        else:
+            await cli_loop(active_protocols, runtime)
     finally:
+        runtime.ticker.close()
+        if mmsg_receiver is not None:
+            mmsg_receiver.close()
+        if batch_sender is not None:
+            batch_sender.close()
         server.close()
         if hasattr(server, "wait_closed"):
             await server.wait_closed()
 
+        # Flush every CLM log and drain the writer threads here rather than
+        # relying on atexit, which forked workers skip via os._exit().
+        for p in active_protocols:
+            p._release()
         try:
             if config.secrets_log_file:
                 config.secrets_log_file.close()
         except Exception:
             pass
-
-        qlog_path = os.path.join(args.qlog_dir, f"server_{int(time.time())}.qlog.json")
-        write_qlog(quic_logger, qlog_path)
-        log("SERVER", "FILE", f"wrote qlog: {qlog_path}", use_color=use_color)
+        AsyncFileWriter.close_all()
+
+        if quic_logger is not None:
+            # In file mode this holds only connections still open at exit.
+            if args.workers > 1:
+                qlog_name = f"server_{os.getpid()}_{int(time.time())}.qlog.json"
+            else:
+                qlog_name = f"server_{int(time.time())}.qlog.json"
+            qlog_path = os.path.join(args.qlog_dir, qlog_name)
+            write_qlog(quic_logger, qlog_path)
+            log("SERVER", "FILE", f"wrote qlog: {qlog_path}", use_color=use_color)
         log("SERVER", "CLOSE", "Bye", use_color=use_color)
 
 
+def run_worker(args: argparse.Namespace, config: QuicConfiguration, worker_index: int):
+    """Body of a forked worker process; never returns."""
+    code = 0
+    try:
+        asyncio.run(main(args, config, worker_index))
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    config = build_config(args)
+
+    # Fork before any loop or log-writer thread exists.
+    workers = []
+    for worker_index in range(1, args.workers):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(args, config, worker_index)
+        workers.append(pid)
+
+    try:
+        asyncio.run(main(args, config))
+    finally:
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in workers:
+            os.waitpid(pid, 0)
@@ -0,0 +1,421 @@
+"""
+Batched UDP I/O for the QUIC server socket (Linux only).
+
+aioquic hands every datagram to the transport's sendto(), which costs one
+syscall per packet. BatchingSender collects the datagrams produced during
+one event-loop iteration and sends runs of equal-sized datagrams to the same
+peer with a single UDP GSO sendmsg(); the kernel splits the buffer back into
+wire datagrams. Anything that cannot be batched goes through the transport's
+original sendto(), so buffering and error reporting stay with asyncio.
+
+set_socket_buffers() enlarges the socket buffers so bursts are not dropped
+before the event loop gets to them.
+
+On the receive side, MmsgReceiver replaces the selector transport's
+one-recvfrom-per-wakeup reader with recvmmsg(), draining up to
+RECV_BATCH datagrams per syscall into preallocated buffers. With UDP GRO
+enabled, the kernel may also coalesce same-flow datagrams into one buffer,
+which is split back up using the segment size from the control message.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+import sys
+from typing import Any, List, Optional, Tuple
+
+# Not exported by the socket module on all Python versions.
+UDP_SEGMENT = getattr(socket, "UDP_SEGMENT", 103)
+UDP_GRO = getattr(socket, "UDP_GRO", 104)
+
+# Datagrams per recvmmsg() call, and the per-datagram buffer size. QUIC
+# datagrams from aioquic peers stay well under 1500 bytes; with GRO one
+# buffer may hold a coalesced train of them, up to the UDP maximum.
+RECV_BATCH = 64
+RECV_BUFFER_SIZE = 2048
+RECV_GRO_BUFFER_SIZE = 65535
+
+# Ask the kernel to deliver only packets it processed on a given CPU (Linux 3.19+).
+SO_INCOMING_CPU = getattr(socket, "SO_INCOMING_CPU", 49)
+
+# Linux-only variants that bypass net.core.{r,w}mem_max (need CAP_NET_ADMIN).
+SO_RCVBUFFORCE = getattr(socket, "SO_RCVBUFFORCE", 33)
+SO_SNDBUFFORCE = getattr(socket, "SO_SNDBUFFORCE", 32)
+
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0x40)
+MSG_TRUNC = getattr(socket, "MSG_TRUNC", 0x20)
+
+# Kernel limits for one GSO send (UDP_MAX_SEGMENTS and the UDP length field).
+GSO_MAX_SEGMENTS = 64
+GSO_MAX_BYTES = 65000
+
+# errnos meaning "GSO is not usable here" (old kernel, NIC without checksum offload).
+_GSO_UNSUPPORTED = {errno.EIO, errno.EINVAL, errno.ENOPROTOOPT, errno.EOPNOTSUPP}
+
+
+def _set_buffer(sock: socket.socket, option: int, force_option: int, size: int) -> int:
+    sock.setsockopt(socket.SOL_SOCKET, option, size)
+    # Linux reports double the requested size; anything less means the
+    # kernel clamped the request to its *mem_max sysctl.
+    if sys.platform.startswith("linux") and sock.getsockopt(socket.SOL_SOCKET, option) < 2 * size:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, force_option, size)
+        except OSError:
+            pass
+    return sock.getsockopt(socket.SOL_SOCKET, option)
+
+
+def set_socket_buffers(sock: socket.socket, rcvbuf: int, sndbuf: int) -> Tuple[int, int]:
+    """
+    Enlarge the socket's receive/send buffers; a size of 0 leaves that buffer alone.
+
+    Returns the sizes the kernel reports afterwards, which may be clamped.
+    """
+    if rcvbuf > 0:
+        _set_buffer(sock, socket.SO_RCVBUF, SO_RCVBUFFORCE, rcvbuf)
+    if sndbuf > 0:
+        _set_buffer(sock, socket.SO_SNDBUF, SO_SNDBUFFORCE, sndbuf)
+    return (
+        sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+        sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+    )
+
+
+def set_incoming_cpu(sock: socket.socket, cpu: int) -> bool:
+    """Steer the socket to packets received on cpu; returns False where unsupported."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_INCOMING_CPU, cpu)
+    except OSError:
+        return False
+    return True
+
+
+class BatchingSender:
+    def __init__(self, transport: asyncio.DatagramTransport):
+        self._transport = transport
+        self._sendto = transport.sendto
+        self._loop = asyncio.get_event_loop()
+        # A dup of the transport's socket, since the TransportSocket wrapper
+        # does not expose sendmsg().
+        self._sock = transport.get_extra_info("socket").dup()
+        self._pending: List[Tuple[bytes, Any]] = []
+        self._scheduled = False
+        self.gso_enabled = True
+
+    def sendto(self, data: bytes, addr: Any = None) -> None:
+        self._pending.append((data, addr))
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon(self.flush)
+
+    def flush(self) -> None:
+        self._scheduled = False
+        pending, self._pending = self._pending, []
+        if self._transport.is_closing():
+            return
+
+        i = 0
+        n = len(pending)
+        while i < n:
+            data, addr = pending[i]
+            size = len(data)
+
+            # Extend the run while datagrams go to the same peer with the same
+            # size; GSO allows only the last segment to be shorter.
+            j = i + 1
+            total = size
+            while j < n and j - i < GSO_MAX_SEGMENTS:
+                next_data, next_addr = pending[j]
+                next_size = len(next_data)
+                if next_addr != addr or next_size > size or total + next_size > GSO_MAX_BYTES:
+                    break
+                total += next_size
+                j += 1
+                if next_size < size:
+                    break
+
+            if j - i < 2 or not self._send_gso(pending[i:j], size, addr):
+                for d, a in pending[i:j]:
+                    self._sendto(d, a)
+            i = j
+
+    def _send_gso(self, run: List[Tuple[bytes, Any]], segment_size: int, addr: Any) -> bool:
+        # Datagrams asyncio has already buffered must leave first; let it drain.
+        if not self.gso_enabled or self._transport.get_write_buffer_size():
+            return False
+
+        try:
+            self._sock.sendmsg(
+                [b"".join(d for d, _ in run)],
+                [(socket.IPPROTO_UDP, UDP_SEGMENT, struct.pack("=H", segment_size))],
+                0,
+                addr,
+            )
+        except (BlockingIOError, InterruptedError):
+            return False
+        except OSError as exc:
+            if exc.errno in _GSO_UNSUPPORTED:
+                self.gso_enabled = False
+            return False
+        return True
+
+    def close(self) -> None:
+        # Restore direct sends so packets written after this (e.g. the
+        # CONNECTION_CLOSE frames sent by server.close()) are not lost.
+        if self._transport.__dict__.get("sendto") == self.sendto:
+            del self._transport.sendto
+        self.flush()
+        self._sock.close()
+
+
+def _is_selector_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    return isinstance(loop, asyncio.selector_events.BaseSelectorEventLoop)
+
+
+def install_batching_sender(transport: asyncio.DatagramTransport) -> Optional[BatchingSender]:
+    """
+    Route transport.sendto() through a BatchingSender.
+
+    Returns None where batching is unavailable: non-Linux platforms, or
+    loops other than asyncio's selector loop (uvloop already writes from C).
+    """
+    if not sys.platform.startswith("linux") or not _is_selector_loop(asyncio.get_event_loop()):
+        return None
+
+    try:
+        sender = BatchingSender(transport)
+    except (AttributeError, OSError):
+        return None
+
+    try:
+        transport.sendto = sender.sendto
+    except AttributeError:
+        sender.close()
+        return None
+    return sender
+
+
+class _Iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _Msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_Iovec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _Mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _Msghdr), ("msg_len", ctypes.c_uint)]
+
+
+_SOCKADDR_STORAGE_SIZE = 128
+
+# Per-message control buffer; only the UDP_GRO cmsg (one int) is expected.
+_CONTROL_SIZE = 64
+_CMSGHDR = struct.Struct("@Nii")
+_CMSG_ALIGN = ctypes.sizeof(ctypes.c_size_t)
+
+
+def _cmsg_align(n: int) -> int:
+    return (n + _CMSG_ALIGN - 1) & ~(_CMSG_ALIGN - 1)
+
+
+def _gro_segment_size(control: memoryview, length: int) -> int:
+    """Return the UDP_GRO segment size from a received control buffer, or 0."""
+    offset = 0
+    while offset + _CMSGHDR.size <= length:
+        cmsg_len, level, kind = _CMSGHDR.unpack_from(control, offset)
+        if cmsg_len < _CMSGHDR.size:
+            break
+        if level == socket.IPPROTO_UDP and kind == UDP_GRO:
+            return struct.unpack_from("=i", control, offset + _cmsg_align(_CMSGHDR.size))[0]
+        offset += _cmsg_align(cmsg_len)
+    return 0
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.recvmmsg.argtypes = [
+            ctypes.c_int,
+            ctypes.POINTER(_Mmsghdr),
+            ctypes.c_uint,
+            ctypes.c_int,
+            ctypes.c_void_p,
+        ]
+        libc.recvmmsg.restype = ctypes.c_int
+        _libc = libc
+    return _libc
+
+
+def _parse_sockaddr(raw: memoryview) -> Any:
+    """Decode a sockaddr_in/sockaddr_in6 into the address tuple asyncio would report."""
+    family = struct.unpack_from("=H", raw, 0)[0]
+    port = struct.unpack_from("!H", raw, 2)[0]
+    if family == socket.AF_INET:
+        return socket.inet_ntop(socket.AF_INET, raw[4:8]), port
+    flowinfo = struct.unpack_from("!I", raw, 4)[0]
+    scope_id = struct.unpack_from("=I", raw, 24)[0]
+    return socket.inet_ntop(socket.AF_INET6, raw[8:24]), port, flowinfo, scope_id
+
+
+class MmsgReceiver:
+    def __init__(
+        self,
+        transport: asyncio.DatagramTransport,
+        loop: asyncio.AbstractEventLoop,
+        *,
+        gro: bool = True,
+    ):
+        self._libc = _load_libc()
+        self._transport = transport
+        self._protocol = transport.get_protocol()
+        self._loop = loop
+        self._sock = transport.get_extra_info("socket")
+        self._fd = self._sock.fileno()
+
+        # GRO is only turned on here, where the control messages are read;
+        # asyncio's own reader would hand coalesced buffers to aioquic whole.
+        self.gro_enabled = False
+        if gro:
+            try:
+                self._sock.setsockopt(socket.IPPROTO_UDP, UDP_GRO, 1)
+                self.gro_enabled = True
+            except OSError:
+                pass
+        self._buffer_size = RECV_GRO_BUFFER_SIZE if self.gro_enabled else RECV_BUFFER_SIZE
+
+        # One contiguous block per array; the headers point into it once and
+        # are reused for every call.
+        self._data = (ctypes.c_char * (RECV_BATCH * self._buffer_size))()
+        self._names = (ctypes.c_char * (RECV_BATCH * _SOCKADDR_STORAGE_SIZE))()
+        self._control = (ctypes.c_char * (RECV_BATCH * _CONTROL_SIZE))()
+        self._iovecs = (_Iovec * RECV_BATCH)()
+        self._hdrs = (_Mmsghdr * RECV_BATCH)()
+        data_base = ctypes.addressof(self._data)
+        names_base = ctypes.addressof(self._names)
+        control_base = ctypes.addressof(self._control)
+        for i in range(RECV_BATCH):
+            self._iovecs[i].iov_base = data_base + i * self._buffer_size
+            self._iovecs[i].iov_len = self._buffer_size
+            hdr = self._hdrs[i].msg_hdr
+            hdr.msg_name = names_base + i * _SOCKADDR_STORAGE_SIZE
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_namelen = _SOCKADDR_STORAGE_SIZE
+            if self.gro_enabled:
+                hdr.msg_control = control_base + i * _CONTROL_SIZE
+                hdr.msg_controllen = _CONTROL_SIZE
+        # recvmmsg() only rewrites the headers it fills, so only those need
+        # their in/out lengths restored before the next call.
+        self._last_count = 0
+        self._data_view = memoryview(self._data).cast("B")
+        self._names_view = memoryview(self._names).cast("B")
+        self._control_view = memoryview(self._control).cast("B")
+
+        # The public add_reader() refuses fds owned by a transport; use the
+        # same internal calls the transport uses to register itself.
+        loop._remove_reader(self._fd)
+        loop._add_reader(self._fd, self._read_ready)
+
+    def _read_ready(self) -> None:
+        hdrs = self._hdrs
+        gro_enabled = self.gro_enabled
+        for i in range(self._last_count):
+            hdr = hdrs[i].msg_hdr
+            hdr.msg_namelen = _SOCKADDR_STORAGE_SIZE
+            if gro_enabled:
+                hdr.msg_controllen = _CONTROL_SIZE
+        self._last_count = 0
+
+        count = self._libc.recvmmsg(self._fd, hdrs, RECV_BATCH, MSG_DONTWAIT, None)
+        if count < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self._protocol.error_received(OSError(err, os.strerror(err)))
+            return
+        self._last_count = count
+
+        data_view = self._data_view
+        names_view = self._names_view
+        control_view = self._control_view
+        buffer_size = self._buffer_size
+        datagram_received = self._protocol.datagram_received
+        for i in range(count):
+            if self._transport.is_closing():
+                return
+            hdr = hdrs[i]
+            if hdr.msg_hdr.msg_flags & MSG_TRUNC:
+                continue
+            offset = i * buffer_size
+            end = offset + hdr.msg_len
+            name_offset = i * _SOCKADDR_STORAGE_SIZE
+            addr = _parse_sockaddr(names_view[name_offset : name_offset + _SOCKADDR_STORAGE_SIZE])
+
+            segment_size = 0
+            if gro_enabled and hdr.msg_hdr.msg_controllen:
+                control_offset = i * _CONTROL_SIZE
+                segment_size = _gro_segment_size(
+                    control_view[control_offset : control_offset + _CONTROL_SIZE],
+                    hdr.msg_hdr.msg_controllen,
+                )
+            if segment_size <= 0:
+                segment_size = hdr.msg_len
+
+            # aioquic parses datagrams as read-only bytes and may keep them,
+            # so each one is copied out of the shared buffer.
+            while offset < end:
+                datagram_received(bytes(data_view[offset : min(offset + segment_size, end)]), addr)
+                offset += segment_size
+
+    def close(self) -> None:
+        # Hand the fd back to the transport's own reader, which cannot split
+        # GRO buffers.
+        if not self._transport.is_closing():
+            if self.gro_enabled:
+                try:
+                    self._sock.setsockopt(socket.IPPROTO_UDP, UDP_GRO, 0)
+                except OSError:
+                    pass
+            self._loop._remove_reader(self._fd)
+            self._loop._add_reader(self._fd, self._transport._read_ready)
+
+
+def install_mmsg_receiver(transport: asyncio.DatagramTransport) -> Optional[MmsgReceiver]:
+    """
+    Replace the transport's socket reader with a recvmmsg()-based one.
+
+    Returns None where this is unavailable: non-Linux platforms, or loops
+    other than asyncio's selector loop (e.g. uvloop), whose reader cannot
+    be swapped out.
+    """
+    if not sys.platform.startswith("linux") or not hasattr(socket, "CMSG_SPACE"):
+        return None
+
+    loop = asyncio.get_event_loop()
+    if not _is_selector_loop(loop):
+        return None
+    if not hasattr(transport, "_read_ready"):
+        return None
+
+    try:
+        return MmsgReceiver(transport, loop)
+    except (AttributeError, OSError):
+        return None